@@ -1,2 +1,5 @@
 from .podman_api import PodmanApi
 from .podman_socket import PodmanSocket
+from .log_aggregator import LogAggregator, LogLine
+from .single_flight import SingleFlight
+from .transport import RecordingTransport, ReplayMissError, ReplayTransport
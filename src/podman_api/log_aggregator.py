@@ -0,0 +1,276 @@
+import heapq
+import re
+import socket
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from logging import getLogger
+from typing import Any, Deque, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import requests
+
+from .podman_api import PodmanApi
+
+logger = getLogger('podman-api')
+
+_TIMESTAMP_PATTERN = re.compile(
+    r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.(\d{1,9})\d*)?(Z|[+-]\d{2}:\d{2})? ?'
+)
+
+
+class LogLine(NamedTuple):
+    timestamp: int
+    container: str
+    stream: str
+    message: str
+
+
+class _ContainerBuffer:
+
+    def __init__(self, container: str) -> None:
+        self.container = container
+        self.lines: Deque[Tuple[LogLine, float]] = deque()
+        self.finished = False
+        self.queued = False
+        self.dropped = 0
+
+
+class LogAggregator:
+    """
+    Follows the logs of several containers at once and merges them into one stream ordered by timestamp.
+
+    Every container is read by its own thread into a bounded buffer. overflow_policy decides what happens
+    when a buffer is full: 'block' stops reading from the socket until the consumer catches up,
+    'drop_oldest' and 'drop_newest' discard lines and count them in dropped.
+    As long as every container has a buffered line the merge is exact. A line that waited longer than
+    reorder_window seconds is emitted even if other containers have not sent anything yet.
+    """
+
+    overflow_policies = ('block', 'drop_oldest', 'drop_newest')
+
+    def __init__(
+        self,
+        podman_api: PodmanApi,
+        containers: List[str] = None,
+        filters: Dict[str, Any] = None,
+        since: str = None,
+        stdout: bool = True,
+        stderr: bool = True,
+        buffer_size: int = 1000,
+        overflow_policy: str = 'block',
+        reorder_window: float = 0.5,
+    ) -> None:
+        if overflow_policy not in self.overflow_policies:
+            raise ValueError(f'overflow_policy must be one of {self.overflow_policies}')
+        if buffer_size < 1:
+            raise ValueError('buffer_size must be at least 1')
+
+        self.podman_api = podman_api
+        self.containers = containers
+        self.filters = filters
+        self.since = since
+        self.stdout = stdout
+        self.stderr = stderr
+        self.buffer_size = buffer_size
+        self.overflow_policy = overflow_policy
+        self.reorder_window = reorder_window
+
+        self._buffers: Dict[str, _ContainerBuffer] = {}
+        self._heap: List[Tuple[int, int, str]] = []
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._responses: Dict[str, requests.Response] = {}
+
+    @property
+    def dropped(self) -> Dict[str, int]:
+        with self._condition:
+            return {name: buffer.dropped for name, buffer in self._buffers.items()}
+
+    def start(self) -> None:
+        containers = list(self.containers or [])
+        if self.filters:
+            for container in self.podman_api.container_list(filters=self.filters):
+                names = container.get('Names') or []
+                if names and names[0] not in containers:
+                    containers.append(names[0])
+
+        logger.info(f'Aggregate logs of {len(containers)} containers')
+        self._stop_event.clear()
+        for container in containers:
+            self._buffers[container] = _ContainerBuffer(container)
+            thread = threading.Thread(
+                target=self._follow,
+                args=(container,),
+                name=f'logs-{container}',
+                daemon=True
+            )
+            self._threads.append(thread)
+            thread.start()
+
+    """
+    Stops following the logs. The streaming responses are aborted, so threads blocked on idle
+    containers end as well, and the threads are joined with the given timeout.
+    """
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop_event.set()
+        with self._condition:
+            responses = list(self._responses.values())
+            self._responses.clear()
+            self._condition.notify_all()
+
+        for response in responses:
+            _abort_response(response)
+
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+            if thread.is_alive():
+                logger.warning(f'Thread {thread.name} did not stop within {timeout} seconds')
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+
+    def __enter__(self) -> 'LogAggregator':
+        self.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+    def __iter__(self) -> Iterator[LogLine]:
+        while not self._stop_event.is_set():
+            line = self._next_line()
+            if line is None:
+                return
+            yield line
+
+    def _follow(self, container: str) -> None:
+        buffer = self._buffers[container]
+        try:
+            for stream, raw_line in self.podman_api.container_logs_stream(
+                container,
+                follow=True,
+                since=self.since,
+                stdout=self.stdout,
+                stderr=self.stderr,
+                timestamps=True,
+                on_response=lambda response: self._register_response(container, response)
+            ):
+                if self._stop_event.is_set():
+                    break
+                timestamp, message = _parse_timestamp(raw_line)
+                self._put(buffer, LogLine(timestamp, container, stream, message))
+        except Exception as err:
+            if not self._stop_event.is_set():
+                logger.warning(f'Stopped following logs of container {container}. {err}')
+        finally:
+            with self._condition:
+                self._responses.pop(container, None)
+                buffer.finished = True
+                self._condition.notify_all()
+
+    def _register_response(self, container: str, response: requests.Response) -> None:
+        with self._condition:
+            if not self._stop_event.is_set():
+                self._responses[container] = response
+                return
+
+        # stop was called while the request was sent
+        _abort_response(response)
+
+    def _put(self, buffer: _ContainerBuffer, line: LogLine) -> None:
+        with self._condition:
+            if len(buffer.lines) >= self.buffer_size:
+                if self.overflow_policy == 'drop_newest':
+                    buffer.dropped += 1
+                    return
+                elif self.overflow_policy == 'drop_oldest':
+                    self._drop_head(buffer)
+                else:
+                    while len(buffer.lines) >= self.buffer_size:
+                        if self._stop_event.is_set():
+                            return
+                        self._condition.wait()
+
+            buffer.lines.append((line, time.monotonic()))
+            if not buffer.queued:
+                self._push_head(buffer)
+            self._condition.notify_all()
+
+    def _drop_head(self, buffer: _ContainerBuffer) -> None:
+        buffer.lines.popleft()
+        buffer.dropped += 1
+        # the heap entry of this buffer points to the dropped line, so it has to be rebuilt
+        self._heap = [entry for entry in self._heap if entry[2] != buffer.container]
+        heapq.heapify(self._heap)
+        buffer.queued = False
+        if buffer.lines:
+            self._push_head(buffer)
+
+    def _push_head(self, buffer: _ContainerBuffer) -> None:
+        self._sequence += 1
+        heapq.heappush(self._heap, (buffer.lines[0][0].timestamp, self._sequence, buffer.container))
+        buffer.queued = True
+
+    def _next_line(self) -> Optional[LogLine]:
+        with self._condition:
+            while not self._stop_event.is_set():
+                pending = [
+                    buffer for buffer in self._buffers.values()
+                    if not (buffer.finished and not buffer.lines)
+                ]
+                if not pending:
+                    return None
+
+                if self._heap:
+                    buffer = self._buffers[self._heap[0][2]]
+                    waited = time.monotonic() - buffer.lines[0][1]
+                    if len(self._heap) == len(pending) or waited >= self.reorder_window:
+                        heapq.heappop(self._heap)
+                        line, _ = buffer.lines.popleft()
+                        buffer.queued = False
+                        if buffer.lines:
+                            self._push_head(buffer)
+                        self._condition.notify_all()
+                        return line
+                    self._condition.wait(self.reorder_window - waited)
+                else:
+                    self._condition.wait()
+
+        return None
+
+
+def _abort_response(response: requests.Response) -> None:
+    """
+    Closes a streaming response that may be read by another thread.
+    Closing alone does not wake up a blocked read, so the socket is shut down first.
+    """
+    connection = getattr(response.raw, '_connection', None)
+    sock = getattr(connection, 'sock', None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+
+def _parse_timestamp(line: str) -> Tuple[int, str]:
+    """
+    Splits a log line written with timestamps=True into the timestamp in nanoseconds since epoch and the message.
+    Lines without a timestamp get the time they were received.
+    """
+    match = _TIMESTAMP_PATTERN.match(line)
+    if not match:
+        return time.time_ns(), line
+
+    seconds, fraction, zone = match.groups()
+    moment = datetime.strptime(seconds, '%Y-%m-%dT%H:%M:%S').replace(tzinfo=timezone.utc)
+    if zone and zone != 'Z':
+        offset = timedelta(hours=int(zone[1:3]), minutes=int(zone[4:6]))
+        moment = moment - offset if zone[0] == '+' else moment + offset
+
+    nanoseconds = int((fraction or '').ljust(9, '0'))
+    return int(moment.timestamp()) * 1_000_000_000 + nanoseconds, line[match.end():]
@@ -1,11 +1,17 @@
-from typing import Any, Dict, List
+import base64
+import ipaddress
+import json
+
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 from pprint import pformat, pprint
 
+import requests
 from extended_config_parser import ExtendedConfigParser
 from custom_logger import Logger
 
 from .podman_api_response import PodmanApiResponse
 from .podman_socket import PodmanSocket
+from .single_flight import SingleFlight
 
 logger = Logger.setup('podman-api')
 config = ExtendedConfigParser()
@@ -16,15 +22,17 @@ class PodmanApi:
     def __init__(
         self,
         podman_socket: PodmanSocket,
+        coalesce_requests: bool = False,
     ) -> None:
         self.podman_socket = podman_socket
         self.api_version = 'v3.0.0'
+        self.archive_chunk_size = 1024 * 1024
+        self.single_flight = SingleFlight() if coalesce_requests else None
 
     def image_list(self) -> List:
         logger.info('List images')
         url = f'/{self.api_version}/libpod/images/json'
-        resp = self.podman_socket.get(url)
-        result = PodmanApiResponse(resp)
+        result = self._get(url)
 
         if result.successfully and isinstance(result.message, list):
             return result.message
@@ -34,8 +42,7 @@ class PodmanApi:
     def image_inspect(self, name: str) -> Dict[str, Any]:
         logger.debug(f'Inspect image {name}')
         url = f'/{self.api_version}/libpod/images/{name}/json'
-        resp = self.podman_socket.get(url)
-        result = PodmanApiResponse(resp)
+        result = self._get(url)
 
         if result.successfully and isinstance(result.message, dict):
             return result.message
@@ -103,8 +110,7 @@ class PodmanApi:
 
         if name:
             url = f'/{self.api_version}/libpod/images/{name}/exists'
-            resp = self.podman_socket.get(url)
-            result = PodmanApiResponse(resp)
+            result = self._get(url)
         else:
             logger.warning("No image name was given")
             return False
@@ -114,13 +120,19 @@ class PodmanApi:
         else:
             return False
 
-    def image_prune(self) -> None:
+    def image_prune(self, filters: Dict[str, Any] = None, all_images: bool = False) -> int:
         logger.info('Prune unused images')
         url = f'/{self.api_version}/libpod/images/prune'
-        params = {'filters': 'dangling=true'}
+        if filters is None:
+            filters = {'dangling': True}
+        params = {
+            'all': all_images,
+            'filters': self._encode_filters(filters)
+        }
         resp = self.podman_socket.post(
             url=url,
             query_params=params,
+            timeout=300,
             headers={
                 'Accept': 'application/json'
             },
@@ -129,10 +141,234 @@ class PodmanApi:
 
         result = PodmanApiResponse(resp)
         if result.successfully:
-            logger.info(f'deleted {len(result.message)} images')
+            reclaimed = self._prune_report_size(result.message)
+            pruned = len(result.message) if isinstance(result.message, list) else 0
+            logger.info(f'deleted {pruned} images, reclaimed {reclaimed} bytes')
+            return reclaimed
         else:
             logger.warning(f"Could not prune images. {result.message.get('cause')}")
 
+        return 0
+
+    def volume_list(self, filters: Dict[str, Any] = None) -> List:
+        logger.info('List volumes')
+        url = f'/{self.api_version}/libpod/volumes/json'
+        params = {'filters': self._encode_filters(filters)}
+        result = self._get(url, query_params=params)
+
+        if result.successfully and isinstance(result.message, list):
+            return result.message
+        else:
+            return []
+
+    def volume_create(
+        self,
+        name: str = None,
+        driver: str = None,
+        labels: Dict[str, str] = None,
+        options: Dict[str, str] = None,
+    ) -> str:
+        logger.info(f'Create volume {name}')
+        url = f'/{self.api_version}/libpod/volumes/create'
+        body = {
+            'Name': name,
+            'Driver': driver,
+            'Label': labels,
+            'Options': options
+        }
+        resp = self.podman_socket.post(
+            url=url,
+            body=body,
+        )
+
+        result = PodmanApiResponse(resp)
+
+        if result.successfully:
+            volume_name = result.message.get('name')
+            if isinstance(volume_name, str):
+                logger.info(f"Created volume {volume_name}")
+                return volume_name
+        else:
+            logger.warning(f"Could not create volume {name}. {result.message.get('cause')}")
+
+        return ''
+
+    def volume_inspect(self, name: str) -> Dict[str, Any]:
+        logger.debug(f'Inspect volume {name}')
+        url = f'/{self.api_version}/libpod/volumes/{name}/json'
+        result = self._get(url)
+
+        if result.successfully and isinstance(result.message, dict):
+            return result.message
+        else:
+            return {}
+
+    def volume_exists(self, name: str) -> bool:
+
+        if name:
+            url = f'/{self.api_version}/libpod/volumes/{name}/exists'
+            result = self._get(url)
+        else:
+            logger.warning("No volume name was given")
+            return False
+
+        if result.successfully:
+            return True
+        else:
+            return False
+
+    def volume_delete(self, name: str, force: bool = False) -> None:
+        logger.info(f'Delete volume {name}')
+        if self.volume_exists(name):
+            url = f'/{self.api_version}/libpod/volumes/{name}'
+            resp = self.podman_socket.delete(url=url, params={'force': force})
+            result = PodmanApiResponse(resp)
+        else:
+            logger.warning(f"volume {name} does not exist")
+            return
+
+        if result.successfully:
+            logger.info(f"Deleted volume {name}")
+        else:
+            logger.warning(f"Could not delete volume {name}")
+            if result.message:
+                logger.warning(f"{result.message.get('cause')}")
+
+    def volume_prune(self, filters: Dict[str, Any] = None) -> int:
+        logger.info('Prune unused volumes')
+        url = f'/{self.api_version}/libpod/volumes/prune'
+        params = {'filters': self._encode_filters(filters)}
+        resp = self.podman_socket.post(
+            url=url,
+            query_params=params,
+            timeout=300,
+            headers={
+                'Accept': 'application/json'
+            },
+        )
+
+        result = PodmanApiResponse(resp)
+        if result.successfully:
+            reclaimed = self._prune_report_size(result.message)
+            pruned = len(result.message) if isinstance(result.message, list) else 0
+            logger.info(f'deleted {pruned} volumes, reclaimed {reclaimed} bytes')
+            return reclaimed
+        else:
+            logger.warning(f"Could not prune volumes. {result.message.get('cause')}")
+
+        return 0
+
+    def network_list(self, filters: Dict[str, Any] = None) -> List:
+        logger.info('List networks')
+        url = f'/{self.api_version}/libpod/networks/json'
+        params = {'filters': self._encode_filters(filters)}
+        result = self._get(url, query_params=params)
+
+        if result.successfully and isinstance(result.message, list):
+            return result.message
+        else:
+            return []
+
+    def network_create(
+        self,
+        name: str,
+        driver: str = None,
+        subnet: str = None,
+        gateway: str = None,
+        internal: bool = False,
+        disable_dns: bool = False,
+        labels: Dict[str, str] = None,
+        options: Dict[str, str] = None,
+    ) -> str:
+        logger.info(f'Create network {name}')
+        url = f'/{self.api_version}/libpod/networks/create'
+        body = {
+            'Driver': driver,
+            'Subnet': self._encode_subnet(subnet),
+            'Gateway': gateway,
+            'Internal': internal,
+            'DisableDNS': disable_dns,
+            'Labels': labels,
+            'Options': options
+        }
+        resp = self.podman_socket.post(
+            url=url,
+            query_params={'name': name},
+            body=body,
+        )
+
+        result = PodmanApiResponse(resp)
+
+        if result.successfully:
+            logger.info(f"Created network {name}")
+            return name
+        else:
+            logger.warning(f"Could not create network {name}. {result.message.get('cause')}")
+
+        return ''
+
+    def network_inspect(self, name: str) -> Dict[str, Any]:
+        logger.debug(f'Inspect network {name}')
+        url = f'/{self.api_version}/libpod/networks/{name}/json'
+        result = self._get(url)
+
+        if result.successfully and isinstance(result.message, dict):
+            return result.message
+        else:
+            return {}
+
+    def network_delete(self, name: str, force: bool = False) -> None:
+        logger.info(f'Delete network {name}')
+        url = f'/{self.api_version}/libpod/networks/{name}'
+        resp = self.podman_socket.delete(url=url, params={'force': force})
+        result = PodmanApiResponse(resp)
+
+        if result.successfully:
+            logger.info(f"Deleted network {name}")
+        else:
+            logger.warning(f"Could not delete network {name}")
+            if isinstance(result.message, dict):
+                logger.warning(f"{result.message.get('cause')}")
+
+    def network_prune(self, filters: Dict[str, Any] = None) -> List[str]:
+        logger.info('Prune unused networks')
+        url = f'/{self.api_version}/libpod/networks/prune'
+        params = {'filters': self._encode_filters(filters)}
+        resp = self.podman_socket.post(
+            url=url,
+            query_params=params,
+            headers={
+                'Accept': 'application/json'
+            },
+        )
+
+        result = PodmanApiResponse(resp)
+        if result.successfully and isinstance(result.message, list):
+            pruned = [
+                report.get('Name') for report in result.message
+                if isinstance(report, dict) and not report.get('Error')
+            ]
+            logger.info(f'deleted {len(pruned)} networks')
+            return pruned
+        elif not result.successfully and isinstance(result.message, dict):
+            logger.warning(f"Could not prune networks. {result.message.get('cause')}")
+
+        return []
+
+    def container_list(self, all_containers: bool = False, filters: Dict[str, Any] = None) -> List:
+        logger.info('List containers')
+        url = f'/{self.api_version}/libpod/containers/json'
+        params = {
+            'all': all_containers,
+            'filters': self._encode_filters(filters)
+        }
+        result = self._get(url, query_params=params)
+
+        if result.successfully and isinstance(result.message, list):
+            return result.message
+        else:
+            return []
+
     def container_create(
         self,
         image: str,
@@ -247,8 +483,7 @@ class PodmanApi:
         logger.debug(f'Inspect container {name}')
         if self.container_exists(name):
             url = f'/{self.api_version}/libpod/containers/{name}/json'
-            resp = self.podman_socket.get(url)
-            result = PodmanApiResponse(resp)
+            result = self._get(url)
         else:
             logger.warning(f"container {name} does not exist")
             return {}
@@ -262,8 +497,7 @@ class PodmanApi:
 
         if name:
             url = f'/{self.api_version}/libpod/containers/{name}/exists'
-            resp = self.podman_socket.get(url)
-            result = PodmanApiResponse(resp)
+            result = self._get(url)
         else:
             logger.warning("No container name was given")
             return False
@@ -361,6 +595,157 @@ class PodmanApi:
         else:
             logger.warning(f"Could not execute {cmd} in container {name}. {result.message.get('cause')}")
 
+    def container_checkpoint(
+        self,
+        name: str,
+        export: str = None,
+        keep: bool = False,
+        leave_running: bool = False,
+        tcp_established: bool = False,
+        ignore_root_fs: bool = False,
+    ) -> bool:
+        logger.info(f'Checkpoint container {name}')
+        if not self.container_exists(name):
+            logger.warning(f"container {name} does not exist")
+            return False
+
+        url = f'/{self.api_version}/libpod/containers/{name}/checkpoint'
+        resp = self.podman_socket.post(
+            url=url,
+            query_params={
+                'keep': keep,
+                'leaveRunning': leave_running,
+                'tcpEstablished': tcp_established,
+                'ignoreRootFS': ignore_root_fs,
+                'export': export is not None
+            },
+            timeout=300,
+            headers={
+                'Accept': 'application/x-tar' if export else 'application/json'
+            },
+            stream=export is not None
+        )
+
+        if export and resp.status_code == 200:
+            with resp, open(export, 'wb') as archive:
+                for chunk in resp.iter_content(chunk_size=self.archive_chunk_size):
+                    archive.write(chunk)
+            logger.info(f"Checkpointed container {name} to {export}")
+            return True
+
+        result = PodmanApiResponse(resp)
+
+        if result.successfully:
+            logger.info(f"Checkpointed container {name}")
+            return True
+        else:
+            logger.warning(f"Could not checkpoint container {name}")
+            if isinstance(result.message, dict):
+                logger.warning(f"{result.message.get('cause')}")
+
+        return False
+
+    def container_restore(
+        self,
+        name: str,
+        import_archive: str = None,
+        keep: bool = False,
+        tcp_established: bool = False,
+        ignore_root_fs: bool = False,
+        ignore_static_ip: bool = False,
+        ignore_static_mac: bool = False,
+    ) -> str:
+        logger.info(f'Restore container {name}')
+        params: Dict[str, Any] = {
+            'keep': keep,
+            'tcpEstablished': tcp_established,
+            'ignoreRootFS': ignore_root_fs,
+            'ignoreStaticIP': ignore_static_ip,
+            'ignoreStaticMAC': ignore_static_mac
+        }
+        url = f'/{self.api_version}/libpod/containers/{name}/restore'
+
+        if import_archive:
+            params.update({'import': True, 'name': name})
+            with open(import_archive, 'rb') as archive:
+                resp = self.podman_socket.post(
+                    url=url,
+                    query_params=params,
+                    timeout=300,
+                    headers={
+                        'Content-type': 'application/x-tar',
+                        'Accept': 'application/json'
+                    },
+                    data=archive
+                )
+        elif self.container_exists(name):
+            resp = self.podman_socket.post(
+                url=url,
+                query_params=params,
+                timeout=300
+            )
+        else:
+            logger.warning(f"container {name} does not exist")
+            return ''
+
+        result = PodmanApiResponse(resp)
+
+        if result.successfully:
+            logger.info(f"Restored container {name}")
+            container_id = result.message.get('id')
+            if isinstance(container_id, str):
+                return container_id
+        else:
+            logger.warning(f"Could not restore container {name}")
+            if isinstance(result.message, dict):
+                logger.warning(f"{result.message.get('cause')}")
+
+        return ''
+
+    def container_commit(
+        self,
+        name: str,
+        repo: str = None,
+        tag: str = None,
+        comment: str = None,
+        author: str = None,
+        changes: List[str] = None,
+        pause: bool = True,
+        image_format: str = None,
+    ) -> str:
+        logger.info(f'Commit container {name}')
+        if not self.container_exists(name):
+            logger.warning(f"container {name} does not exist")
+            return ''
+
+        url = f'/{self.api_version}/libpod/commit'
+        resp = self.podman_socket.post(
+            url=url,
+            query_params={
+                'container': name,
+                'repo': repo,
+                'tag': tag,
+                'comment': comment,
+                'author': author,
+                'changes': changes,
+                'pause': pause,
+                'format': image_format
+            },
+            timeout=300
+        )
+
+        result = PodmanApiResponse(resp)
+
+        if result.successfully:
+            image_id = result.message.get('id')
+            if isinstance(image_id, str):
+                logger.info(f"Committed container {name} to image {image_id}")
+                return image_id
+        else:
+            logger.warning(f"Could not commit container {name}. {result.message.get('cause')}")
+
+        return ''
+
     def container_logs(
         self,
         name: str,
@@ -391,3 +776,183 @@ class PodmanApi:
             parsed_content = decoded_content.replace('\x01\x00\x00\x00\x00\x00\x00\x04', '\n')
 
             return parsed_content
+
+    """
+    Yields (stream, line) tuples of the container logs while they are read from the socket.
+    stream is either 'stdout' or 'stderr'. With follow=True the generator runs until the container stops.
+    on_response is called with the streaming response, e.g. to close it from another thread.
+    """
+
+    def container_logs_stream(
+        self,
+        name: str,
+        follow: bool = False,
+        since: str = None,
+        until: str = None,
+        stderr: bool = True,
+        stdout: bool = True,
+        timestamps: bool = False,
+        on_response: Callable[[requests.Response], None] = None
+    ) -> Iterator[Tuple[str, str]]:
+        logger.info(f'Stream logs from container {name}')
+        if not self.container_exists(name):
+            logger.warning(f"container {name} does not exist")
+            return
+
+        url = f'/{self.api_version}/libpod/containers/{name}/logs'
+        resp = self.podman_socket.get(
+            url=url,
+            query_params={
+                "follow": follow,
+                "since": since,
+                "until": until,
+                "stderr": stderr,
+                "stdout": stdout,
+                "timestamps": timestamps
+            },
+            timeout=None if follow else 10,
+            stream=True
+        )
+        if on_response is not None:
+            on_response(resp)
+
+        try:
+            if resp.status_code not in (200, 204):
+                logger.warning(f"Could not get logs from container {name}. {PodmanApiResponse(resp).message}")
+                return
+            yield from self._read_log_frames(resp.raw)
+        finally:
+            resp.close()
+
+    """
+    Splits the multiplexed log stream into lines.
+    Every frame starts with an 8 byte header: stream type, 3 padding bytes and the big endian payload size.
+    Containers with a tty send the plain output without headers.
+    """
+
+    @staticmethod
+    def _read_log_frames(raw: Any) -> Iterator[Tuple[str, str]]:
+        stream_names = {0: 'stdout', 1: 'stdout', 2: 'stderr'}
+
+        # read1 returns what is available instead of waiting for a full block,
+        # older urllib3 versions only offer it on the wrapped http.client response
+        read1 = getattr(raw, 'read1', None) or getattr(getattr(raw, '_fp', None), 'read1', None)
+
+        def read_some(size: int) -> bytes:
+            return read1(max(size, 65536)) if read1 is not None else raw.read(size)
+
+        def decode_line(raw_line: bytes) -> str:
+            if raw_line.endswith(b'\r'):
+                raw_line = raw_line[:-1]
+            return raw_line.decode('utf-8', errors='replace')
+
+        # the first bytes decide between frames and tty output, so a short tty line is not held back
+        buffer = bytearray(read_some(8))
+        if not buffer:
+            return
+
+        if buffer[0] in stream_names and buffer[1:4] == b'\x00\x00\x00'[:len(buffer) - 1]:
+            def read_exact(size: int) -> bytes:
+                while len(buffer) < size:
+                    chunk = read_some(size - len(buffer))
+                    if not chunk:
+                        break
+                    buffer.extend(chunk)
+                data = bytes(buffer[:size])
+                del buffer[:size]
+                return data
+
+            header = read_exact(8)
+            while len(header) == 8:
+                stream_name = stream_names.get(header[0], 'stdout')
+                payload = read_exact(int.from_bytes(header[4:8], 'big'))
+                # podman sends one frame per log line, only a newline ends a line
+                raw_lines = payload.split(b'\n')
+                if raw_lines[-1] == b'':
+                    raw_lines.pop()
+                for raw_line in raw_lines:
+                    yield stream_name, decode_line(raw_line)
+                header = read_exact(8)
+        else:
+            while True:
+                *tty_lines, rest = buffer.split(b'\n')
+                for tty_line in tty_lines:
+                    yield 'stdout', decode_line(bytes(tty_line))
+                chunk = read_some(65536)
+                if not chunk:
+                    break
+                buffer = rest + chunk
+            if rest:
+                yield 'stdout', decode_line(bytes(rest))
+
+    def system_df(self) -> Dict[str, Any]:
+        logger.info('Get disk usage')
+        url = f'/{self.api_version}/libpod/system/df'
+        result = self._get(url)
+
+        if result.successfully and isinstance(result.message, dict):
+            return result.message
+        else:
+            return {}
+
+    """
+    Sends a GET request and parses the response.
+    With coalesce_requests identical requests running at the same time share one request and its response,
+    so the returned message must not be modified by the caller.
+    """
+
+    def _get(self, url: str, query_params: Dict = None) -> PodmanApiResponse:
+        def request() -> PodmanApiResponse:
+            return PodmanApiResponse(self.podman_socket.get(url, query_params=query_params))
+
+        if self.single_flight is None:
+            return request()
+
+        key = ('GET', url, json.dumps(query_params, sort_keys=True, default=str))
+        return self.single_flight.do(key, request)
+
+    """
+    Encodes a filter dictonary to the json format of the podman api.
+    Values may be single values or lists, e.g. {'label': ['a=b'], 'until': '24h'}
+    """
+
+    @staticmethod
+    def _encode_filters(filters: Dict[str, Any] = None) -> Optional[str]:
+        if not filters:
+            return None
+
+        encoded_filters: Dict[str, List[str]] = {}
+        for key, value in filters.items():
+            values = value if isinstance(value, list) else [value]
+            encoded_filters[key] = [str(v).lower() if isinstance(v, bool) else str(v) for v in values]
+
+        return json.dumps(encoded_filters)
+
+    """
+    Converts a CIDR like '10.89.10.0/24' to the json format of a go net.IPNet
+    """
+
+    @staticmethod
+    def _encode_subnet(subnet: str = None) -> Optional[Dict[str, str]]:
+        if not subnet:
+            return None
+
+        network = ipaddress.ip_network(subnet, strict=False)
+        return {
+            'IP': str(network.network_address),
+            'Mask': base64.b64encode(network.netmask.packed).decode('ascii')
+        }
+
+    """
+    Returns the sum of reclaimed bytes of a prune report
+    """
+
+    @staticmethod
+    def _prune_report_size(reports: Any) -> int:
+        reclaimed = 0
+        if isinstance(reports, list):
+            for report in reports:
+                if isinstance(report, dict) and not report.get('Err'):
+                    reclaimed += report.get('Size') or 0
+
+        return reclaimed
@@ -1,9 +1,10 @@
 import time
 from logging import getLogger
-from typing import Dict
+from typing import Any, Dict, Optional
 
 import requests
 import requests_unixsocket
+from requests.adapters import BaseAdapter
 from extended_config_parser import ExtendedConfigParser
 
 logger = getLogger('podman-api')
@@ -12,13 +13,28 @@ config = ExtendedConfigParser()
 
 class PodmanSocket:
 
-    def __init__(self, socket_path: str) -> None:
+    def __init__(self, socket_path: str, transport: BaseAdapter = None) -> None:
         socket_path = socket_path.replace('/', '%2F')
         self.session = requests_unixsocket.Session()
         self.socket = f'http+unix://{socket_path}'
+        if transport is not None:
+            self.session.mount('http+unix://', transport)
         self._max_connection_retry = int(config['http']['connection_retry'])
         self._connection_retry = 0
 
+    """
+    Closes the session and its transport. A recording is only complete after it was closed.
+    """
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> 'PodmanSocket':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
     def get(
             self,
             url: str,
@@ -27,13 +43,16 @@ class PodmanSocket:
             'Content-type': 'application/json',
             'Accept': 'application/json'
             },
+            timeout: Optional[int] = 3,
+            stream: bool = False,
             **kwargs: Dict) -> requests.Response:
 
         try:
             return self.session.get(
                 f"{self.socket}{url}",
                 params=query_params,
-                timeout=3,
+                timeout=timeout,
+                stream=stream,
                 headers=headers
             )
 
@@ -46,6 +65,8 @@ class PodmanSocket:
                     url=url,
                     query_params=query_params,
                     headers=headers,
+                    timeout=timeout,
+                    stream=stream,
                     **kwargs
                 )
             else:
@@ -61,8 +82,16 @@ class PodmanSocket:
             'Content-type': 'application/json',
             'Accept': 'application/json'
         },
+        stream: bool = False,
+        data: Any = None,
         **kwargs: Dict
     ) -> requests.Response:
+        # file uploads are rewound before a retry, other streamed bodies can not be sent twice
+        seek = getattr(data, 'seek', None)
+        tell = getattr(data, 'tell', None)
+        data_position = tell() if seek is not None and tell is not None else None
+        data_resendable = data is None or isinstance(data, (bytes, str, dict)) or data_position is not None
+
         try:
             response = self.session.post(
                 url=f"{self.socket}{url}",
@@ -70,20 +99,29 @@ class PodmanSocket:
                 params=query_params,
                 json=body,
                 headers=headers,
+                stream=stream,
+                data=data,
                 **kwargs
             )
             self._connection_retry = 0
             return response
         except requests.exceptions.ConnectionError:
+            if not data_resendable:
+                raise
             time.sleep(1)
             self._connection_retry += 1
             logger.warning(f'no connection to host {url}. Retry: {self._connection_retry}')
             if self._connection_retry < self._max_connection_retry:
+                if seek is not None and data_position is not None:
+                    seek(data_position)
                 return self.post(
                     url=url,
                     query_params=query_params,
                     body=body,
                     timeout=timeout,
+                    headers=headers,
+                    stream=stream,
+                    data=data,
                     **kwargs
                 )
             else:
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Call:
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key.
+    The first caller runs the function, every caller that arrives while it is running
+    waits for it and gets the same result (or exception). Finished calls are not cached.
+    hits counts the coalesced calls, misses the calls that really ran.
+    """
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Tuple[int, Hashable], 'asyncio.Future[Any]'] = {}
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.hits += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    """
+    Same as do for coroutines. Calls are only coalesced within the same event loop.
+    fn runs as a task shared by all callers, so a cancelled caller does not cancel the others.
+    """
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+
+        with self._lock:
+            task = self._async_calls.get(loop_key)
+            if task is not None:
+                self.hits += 1
+            else:
+                task = asyncio.ensure_future(fn())
+                self._async_calls[loop_key] = task
+                self.misses += 1
+                task.add_done_callback(lambda finished: self._forget_async(loop_key, finished))
+
+        return await asyncio.shield(task)
+
+    def _forget_async(self, loop_key: Tuple[int, Hashable], task: 'asyncio.Future[Any]') -> None:
+        with self._lock:
+            if self._async_calls.get(loop_key) is task:
+                del self._async_calls[loop_key]
+
+        # mark the exception as retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
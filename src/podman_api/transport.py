@@ -0,0 +1,274 @@
+import base64
+import gzip
+import json
+import threading
+import time
+from collections import deque
+from logging import getLogger
+from typing import Any, Callable, Deque, Dict, List, Optional, TextIO, Tuple
+from urllib.parse import urlsplit
+
+import requests
+import requests_unixsocket
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+logger = getLogger('podman-api')
+
+RECORDING_FORMAT = 'podman-api-recording'
+RECORDING_VERSION = 1
+
+# chunks read within this time are stored as one chunk
+_CHUNK_MERGE_INTERVAL = 0.001
+
+
+class ReplayMissError(requests.exceptions.RequestException):
+    pass
+
+
+def _open_recording(path: str, write: bool = False) -> TextIO:
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt' if write else 'rt', encoding='utf-8')
+    return open(path, 'w' if write else 'r', encoding='utf-8')
+
+
+def _request_key(request: requests.PreparedRequest) -> Tuple[str, str]:
+    url = urlsplit(request.url or '')
+    path = f'{url.path}?{url.query}' if url.query else url.path
+    return str(request.method), path
+
+
+def _encode_body(body: Any) -> Optional[str]:
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if isinstance(body, bytes):
+        return base64.b64encode(body).decode('ascii')
+    return None
+
+
+class _RecordingBody:
+    """
+    Wraps the raw response body and keeps a copy of every chunk that is read together with its arrival time.
+    on_finish is called once the body is read completely or closed.
+    """
+
+    def __init__(self, raw: Any, started: float, on_finish: Callable[[List[Tuple[float, bytes]]], None]) -> None:
+        self._raw = raw
+        self._started = started
+        self._on_finish = on_finish
+        self._chunks: List[Tuple[float, bytearray]] = []
+        self._finished = False
+
+    @property
+    def _connection(self) -> Any:
+        return getattr(self._raw, '_connection', None)
+
+    def read(self, amt: int = None, **kwargs: Any) -> bytes:
+        return self._record(self._raw.read(amt, decode_content=True))
+
+    def read1(self, amt: int = -1) -> bytes:
+        read_block = getattr(self._raw, 'read1', None) or getattr(getattr(self._raw, '_fp', None), 'read1', None)
+        if read_block is None:
+            return self.read(amt if amt > 0 else None)
+        return self._record(read_block(amt))
+
+    def _record(self, data: bytes) -> bytes:
+        if data:
+            offset = time.monotonic() - self._started
+            if self._chunks and offset - self._chunks[-1][0] < _CHUNK_MERGE_INTERVAL:
+                self._chunks[-1][1].extend(data)
+            else:
+                self._chunks.append((offset, bytearray(data)))
+        else:
+            self._finish()
+        return data
+
+    def close(self) -> None:
+        self._finish()
+        self._raw.close()
+
+    def release_conn(self) -> None:
+        self._raw.release_conn()
+
+    def _finish(self) -> None:
+        if not self._finished:
+            self._finished = True
+            self._on_finish([(offset, bytes(chunk)) for offset, chunk in self._chunks])
+
+
+class RecordingTransport(BaseAdapter):
+    """
+    Sends the requests with the given adapter (a unix socket adapter by default) and writes every
+    request/response pair with its timing as one json line to path. Paths ending with .gz are compressed.
+    Streamed responses are written when they are read completely or closed.
+    """
+
+    def __init__(self, path: str, adapter: BaseAdapter = None) -> None:
+        super().__init__()
+        self.adapter = adapter or requests_unixsocket.UnixAdapter()
+        self._lock = threading.Lock()
+        self._file = _open_recording(path, write=True)
+        self._write({'format': RECORDING_FORMAT, 'version': RECORDING_VERSION})
+
+    def send(
+        self,
+        request: requests.PreparedRequest,
+        stream: bool = False,
+        timeout: Any = None,
+        verify: Any = True,
+        cert: Any = None,
+        proxies: Any = None,
+    ) -> requests.Response:
+        started = time.monotonic()
+        response = self.adapter.send(
+            request,
+            stream=stream,
+            timeout=timeout,
+            verify=verify,
+            cert=cert,
+            proxies=proxies
+        )
+        method, path = _request_key(request)
+        entry = {
+            'method': method,
+            'path': path,
+            'body': _encode_body(request.body),
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': dict(response.headers),
+            'latency': round(time.monotonic() - started, 6),
+        }
+
+        def finish(chunks: List[Tuple[float, bytes]]) -> None:
+            entry['chunks'] = [[round(offset, 6), base64.b64encode(data).decode('ascii')] for offset, data in chunks]
+            self._write(entry)
+
+        response.raw = _RecordingBody(response.raw, started, finish)
+        return response
+
+    def close(self) -> None:
+        self.adapter.close()
+        with self._lock:
+            self._file.close()
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            if self._file.closed:
+                logger.warning(f"Recording is closed. Dropped {entry.get('method')} {entry.get('path')}")
+                return
+            self._file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+            self._file.flush()
+
+
+class _ReplayBody:
+
+    def __init__(self, chunks: List[Tuple[float, bytes]], started: float, latency_scale: float) -> None:
+        self._chunks: Deque[Tuple[float, bytes]] = deque(chunks)
+        self._started = started
+        self._latency_scale = latency_scale
+        self._current = b''
+
+    def read(self, amt: int = None, **kwargs: Any) -> bytes:
+        if amt is None:
+            data = self._current + b''.join(self._next_chunk() for _ in range(len(self._chunks)))
+            self._current = b''
+            return data
+
+        if not self._current and self._chunks:
+            self._current = self._next_chunk()
+        data, self._current = self._current[:amt], self._current[amt:]
+        return data
+
+    def read1(self, amt: int = -1) -> bytes:
+        if not self._current and self._chunks:
+            self._current = self._next_chunk()
+        return self.read(amt if amt > 0 else len(self._current))
+
+    def close(self) -> None:
+        self._chunks.clear()
+        self._current = b''
+
+    def release_conn(self) -> None:
+        pass
+
+    def _next_chunk(self) -> bytes:
+        offset, data = self._chunks.popleft()
+        delay = self._started + offset * self._latency_scale - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return data
+
+
+class ReplayTransport(BaseAdapter):
+    """
+    Answers requests with the responses of a recording of RecordingTransport without a podman socket.
+    Requests are matched by method, path with query and (if match_body is set) body.
+    Responses of the same request are returned in recorded order and start again from the first when repeat is set.
+    latency_scale scales the recorded timing, 0 replays without any delay.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        latency_scale: float = 1.0,
+        repeat: bool = True,
+        match_body: bool = True,
+    ) -> None:
+        super().__init__()
+        self.latency_scale = latency_scale
+        self.repeat = repeat
+        self.match_body = match_body
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str, Optional[str]], Deque[Dict[str, Any]]] = {}
+
+        with _open_recording(path) as recording:
+            header = json.loads(recording.readline() or '{}')
+            if header.get('format') != RECORDING_FORMAT:
+                raise ValueError(f'{path} is not a podman api recording')
+            for line in recording:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries.setdefault(self._entry_key(entry), deque()).append(entry)
+
+    def send(
+        self,
+        request: requests.PreparedRequest,
+        stream: bool = False,
+        timeout: Any = None,
+        verify: Any = True,
+        cert: Any = None,
+        proxies: Any = None,
+    ) -> requests.Response:
+        started = time.monotonic()
+        method, path = _request_key(request)
+        key = self._entry_key({'method': method, 'path': path, 'body': _encode_body(request.body)})
+
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise ReplayMissError(f'No recorded response for {method} {path}', request=request)
+            entry = entries.popleft()
+            if self.repeat:
+                entries.append(entry)
+
+        delay = started + entry['latency'] * self.latency_scale - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        chunks = [(offset, base64.b64decode(data)) for offset, data in entry.get('chunks', [])]
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.reason = entry['reason']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = _ReplayBody(chunks, started, self.latency_scale)
+        response.url = request.url or ''
+        response.request = request
+        return response
+
+    def close(self) -> None:
+        pass
+
+    def _entry_key(self, entry: Dict[str, Any]) -> Tuple[str, str, Optional[str]]:
+        return entry['method'], entry['path'], entry['body'] if self.match_body else None